@@ -1,7 +1,12 @@
 # In your backend's API endpoint file (e.g., app/api/v1/activity.py)
 
 import asyncio
+import hmac
+import threading
+from datetime import date, datetime, timezone
+from cachetools import TTLCache
 from fastapi import APIRouter, Depends, Security, HTTPException, status
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 from fastapi.security.api_key import APIKeyHeader
 
@@ -14,10 +19,12 @@ router = APIRouter()
 
 # --- Security Dependency ---
 api_key_header_scheme = APIKeyHeader(name="X-API-Key")
+_DAEMON_API_KEY_BYTES = settings.DAEMON_API_KEY.encode()
 
 def get_api_key(key: str = Security(api_key_header_scheme)):
     """Checks if the provided API key matches the one in our settings."""
-    if key == settings.DAEMON_API_KEY:
+    # Constant-time comparison so response timing doesn't leak the key
+    if hmac.compare_digest(key.encode(), _DAEMON_API_KEY_BYTES):
         return key
     else:
         raise HTTPException(
@@ -25,7 +32,40 @@ def get_api_key(key: str = Security(api_key_header_scheme)):
             detail="Invalid or missing API key"
         )
 
+# --- Employee Lookup ---
+# employee_id -> user id. Daemons post constantly and the mapping only changes when a user is
+# deleted, which calls forget_employee(); the TTL bounds staleness across worker processes.
+_employee_user_ids = TTLCache(maxsize=1024, ttl=600)
+_employee_user_ids_lock = threading.Lock()
+
+def get_user_id_for_employee(db: Session, employee_id: str) -> int | None:
+    with _employee_user_ids_lock:
+        user_id = _employee_user_ids.get(employee_id)
+    if user_id is None:
+        user_id = db.query(models.User.id).filter(models.User.employee_id == employee_id).scalar()
+        if user_id is not None:
+            with _employee_user_ids_lock:
+                _employee_user_ids[employee_id] = user_id
+    return user_id
+
+def forget_employee(employee_id: str) -> None:
+    with _employee_user_ids_lock:
+        _employee_user_ids.pop(employee_id, None)
+
+def _rollup_day(timestamp: datetime) -> date:
+    """
+    The day daily_activity files a log under: the rollup trigger buckets by the UTC date of
+    start_time, not the date in the daemon's local offset.
+    """
+    return timestamp.astimezone(timezone.utc).date() if timestamp.tzinfo else timestamp.date()
+
+def _insert_activity_rows(db: Session, rows: list[dict]) -> None:
+    db.execute(insert(models.ActivityLog), rows)
+    db.commit()
+
 # --- API Endpoint (Corrected and Asynchronous) ---
+# The Session is synchronous, so DB work runs in worker threads via asyncio.to_thread;
+# calling it directly here would block the event loop for every concurrent request.
 
 @router.post("/activity")
 async def receive_activity(
@@ -37,34 +77,42 @@ async def receive_activity(
     Receives a batch of activity logs, categorizes them concurrently,
     and saves them to the database with the correct duration.
     """
-    user = db.query(models.User).filter(models.User.employee_id == payload.employee_id).first()
-    if not user:
+    user_id = await asyncio.to_thread(get_user_id_for_employee, db, payload.employee_id)
+    if user_id is None:
         raise HTTPException(status_code=404, detail=f"Employee ID '{payload.employee_id}' not found")
 
     # --- Concurrent AI Classification ---
-    # Create a list of tasks to be run at the same time
-    classification_tasks = [categorization.classify_activity(log) for log in payload.logs]
-    
-    # Run all the AI classification tasks concurrently
-    processed_results = await asyncio.gather(*classification_tasks)
+    # Repeated (app, title) pairs in the batch are only classified once
+    processed_results = await categorization.classify_activity_batch(payload.logs)
 
     # --- Database Saving ---
-    logs_to_add = []
-    # Loop through the original logs and the processed results together
+    # Merge runs of consecutive logs with the same classification (e.g. 120 five-second samples
+    # of one window) into a single row with the summed duration, then send all rows as a single
+    # executemany INSERT. A run is split when the UTC date changes so daily totals stay accurate.
+    rows = []
     for original_log, (category, details) in zip(payload.logs, processed_results):
-        
-        db_log = models.ActivityLog(
-            user_id=user.id,
-            start_time=original_log.timestamp,
+        # duration is optional in the payload; a log without one adds no time
+        duration = original_log.duration or 0
+        last = rows[-1] if rows else None
+        if (
+            last is not None
+            and last["category"] == category
+            and last["details"] == details
+            and _rollup_day(last["start_time"]) == _rollup_day(original_log.timestamp)
+        ):
+            last["duration_seconds"] += duration
+            continue
+
+        rows.append({
+            "user_id": user_id,
+            "start_time": original_log.timestamp,
             # Use the duration sent by the daemon, not a hardcoded value
-            duration_seconds=original_log.duration, 
-            category=category,
-            details=details
-        )
-        logs_to_add.append(db_log)
-    
-    if logs_to_add:
-        db.add_all(logs_to_add)
-        db.commit()
+            "duration_seconds": duration,
+            "category": category,
+            "details": details,
+        })
+
+    if rows:
+        await asyncio.to_thread(_insert_activity_rows, db, rows)
 
-    return {"status": "ok", "logs_processed": len(logs_to_add)}
\ No newline at end of file
+    return {"status": "ok", "logs_processed": len(payload.logs)}
\ No newline at end of file
@@ -1,13 +1,17 @@
+import asyncio
+import fcntl
+import gzip
+import hashlib
+import os
 import subprocess
-import tempfile
 import shutil
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
-from fastapi import APIRouter, Depends, Security, HTTPException, status
-# --- ADD BackgroundTasks ---
-from fastapi import BackgroundTasks
-from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session, joinedload
-from pydantic import BaseModel
+from fastapi import APIRouter, Depends, Security, HTTPException, Request, status
+from fastapi.responses import FileResponse, JSONResponse
+from sqlalchemy.orm import Session, selectinload
+from pydantic import BaseModel, ConfigDict
 from typing import List
 import uuid
 
@@ -15,6 +19,7 @@ from app.core.config import settings
 from app.db import models, session
 from app.core import security
 from app.schemas import user as user_schema
+from app.api.v1.endpoints import activity
 
 router = APIRouter()
 
@@ -32,13 +37,39 @@ class TeamMember(BaseModel):
     email: str
 
 class TeamDetail(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     manager_id: int
     manager_name: str | None
     member_count: int
     members: List[TeamMember]
 
-    class Config:
-        from_attributes = True
+class InstallerJobStatus(BaseModel):
+    job_id: str
+    status: str
+
+# --- Installer Builds ---
+@dataclass
+class InstallerBuild:
+    installer_name: str
+    path: Path
+    task: asyncio.Future | None = None
+
+    @property
+    def gzip_path(self) -> Path:
+        return self.path.with_name(f"{self.path.name}.gz")
+
+class InstallerFileResponse(FileResponse):
+    # Installers are tens of MB; stream them in 1 MiB reads instead of Starlette's 64 KiB
+    chunk_size = 1024 * 1024
+
+# In-process build jobs keyed by cache key. Builds run in worker threads, so installer
+# requests don't tie up the event loop.
+_installer_builds: dict[str, InstallerBuild] = {}
+# Builds share PyInstaller's work dir, so they run one at a time on their own thread. Queued builds
+# wait here instead of holding threads in the default executor, which serves the DB calls of
+# every other endpoint (including activity ingest).
+_build_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="installer-build")
 
 # --- API Endpoints ---
 
@@ -46,7 +77,7 @@ class TeamDetail(BaseModel):
 def create_user(
     user_in: user_schema.UserCreate,
     db: Session = Depends(session.get_db),
-    admin: models.User = Depends(security.get_current_admin_user)
+    admin: security.CachedUser = Depends(security.get_current_admin_user)
 ):
     """ Creates a new user profile. """
     if db.query(models.User).filter(models.User.email == user_in.email).first():
@@ -68,12 +99,12 @@ def create_user(
 def remove_user(
     user_id: int,
     db: Session = Depends(session.get_db),
-    admin: models.User = Depends(security.get_current_admin_user)
+    admin: security.CachedUser = Depends(security.get_current_admin_user)
 ):
     """
     Deletes a user, but only if they are not a manager with active direct reports.
     """
-    db_user = db.query(models.User).filter(models.User.id == user_id).first()
+    db_user = db.get(models.User, user_id)
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -88,8 +119,11 @@ def remove_user(
             )
     
     # If the check passes, proceed with deletion
+    employee_id = db_user.employee_id
     db.delete(db_user)
     db.commit()
+    activity.forget_employee(employee_id)
+    security.forget_user(user_id)
     return
 
 # ... (The rest of your admin endpoints like GET, PUT, etc. remain the same) ...
@@ -97,7 +131,7 @@ def remove_user(
 @router.get("/users", response_model=List[user_schema.User])
 def get_all_users(
     db: Session = Depends(session.get_db),
-    admin: models.User = Depends(security.get_current_admin_user)
+    admin: security.CachedUser = Depends(security.get_current_admin_user)
 ):
     """ Retrieves a list of all users. """
     return db.query(models.User).all()
@@ -107,18 +141,19 @@ def update_user_details(
     user_id: int,
     updates: UserUpdate,
     db: Session = Depends(session.get_db),
-    admin: models.User = Depends(security.get_current_admin_user)
+    admin: security.CachedUser = Depends(security.get_current_admin_user)
 ):
     """ Updates a user's role, manager, or title. """
-    db_user = db.query(models.User).filter(models.User.id == user_id).first()
+    db_user = db.get(models.User, user_id)
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    update_data = updates.dict(exclude_unset=True)
+    update_data = updates.model_dump(exclude_unset=True)
     for field, value in update_data.items():
         setattr(db_user, field, value)
     
     db.commit()
+    security.forget_user(user_id)
     db.refresh(db_user)
     return db_user
 
@@ -127,10 +162,10 @@ def reset_user_password(
     user_id: int,
     password_in: PasswordReset,
     db: Session = Depends(session.get_db),
-    admin: models.User = Depends(security.get_current_admin_user)
+    admin: security.CachedUser = Depends(security.get_current_admin_user)
 ):
     """ Resets any user's password. """
-    db_user = db.query(models.User).filter(models.User.id == user_id).first()
+    db_user = db.get(models.User, user_id)
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -138,52 +173,53 @@ def reset_user_password(
     db.commit()
     return
 
-@router.get("/installers/{employee_id}")
-async def generate_linux_installer(
-    employee_id: str,
-    # --- ADD BackgroundTasks ---
-    background_tasks: BackgroundTasks,
-    db: Session = Depends(session.get_db),
-    admin: models.User = Depends(security.get_current_admin_user)
-):
-    """
-    Generates a pre-configured, single-file Linux daemon installer for an employee.
-    """
+def _get_employee(db: Session, employee_id: str) -> models.User:
     user = db.query(models.User).filter(models.User.employee_id == employee_id).first()
     if not user:
         raise HTTPException(status_code=404, detail=f"Employee ID '{employee_id}' not found")
+    return user
 
-    daemon_src_path = Path("/home/ashish-ram/Desktop/Final_Year/project/remote-work-tracker/client-daemon/src")
-    if not daemon_src_path.is_dir():
-        raise HTTPException(status_code=500, detail=f"Daemon source directory not found at: {daemon_src_path}")
-    
-    # --- CHANGE: Manually create temp directory ---
-    temp_dir = tempfile.mkdtemp()
-    
-    try:
-        temp_path = Path(temp_dir)
-        
-        config_content = f"""
-[settings]
-employee_id = {user.employee_id}
-backend_url = {settings.DAEMON_BACKEND_URL}
-daemon_api_key = {settings.DAEMON_API_KEY}
-idle_threshold_seconds = 300
-"""
-        (temp_path / "config.ini").write_text(config_content)
-        
-        shutil.copytree(daemon_src_path, temp_path, dirs_exist_ok=True)
-        
-        installer_name = f"tracker-{user.employee_id}"
-        # In your backend's installer API endpoint
+def _hash_directory(path: Path) -> bytes:
+    """ SHA-256 over every source file's relative path and contents, in a stable order. """
+    digest = hashlib.sha256()
+    # Bytecode caches change whenever the source is imported or analyzed, so they're left out
+    for file in sorted(p for p in path.rglob("*") if p.is_file() and "__pycache__" not in p.parts):
+        digest.update(str(file.relative_to(path)).encode())
+        digest.update(file.read_bytes())
+    return digest.digest()
+
+def _build_installer(daemon_src_path: Path, config_content: str, cached_installer: Path) -> None:
+    """
+    Runs PyInstaller straight from the daemon source and moves the executable into the cache. Blocking.
+    Builds share a persistent work dir, so after the first build PyInstaller reuses its analysis
+    and only re-bundles the per-employee config.ini.
+    """
+    work_dir = Path(settings.PYINSTALLER_WORK_DIR)
+    work_dir.mkdir(parents=True, exist_ok=True)
+    # The work dir's config.ini and dist/tracker are shared by every worker process on this host,
+    # so the whole build-and-copy holds an exclusive file lock (_build_executor serializes within one)
+    with open(work_dir / ".build.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        # Another worker may have built this installer while we waited for the lock
+        if cached_installer.exists():
+            return
+
+        # Same path every build so PyInstaller's cached analysis stays valid; only the contents change
+        config_dir = work_dir / "config"
+        config_dir.mkdir(parents=True, exist_ok=True)
+        (config_dir / "config.ini").write_text(config_content)
 
         pyinstaller_command = [
             "pyinstaller",
-            "--name", installer_name,
+            "--name", "tracker",
             "--onefile",
             "--noconsole",
+            "--noconfirm",
+            "--workpath", str(work_dir / "build"),
+            "--distpath", str(work_dir / "dist"),
+            "--specpath", str(work_dir),
             # This bundles the config.ini file
-            f"--add-data", f"{(temp_path / 'config.ini')}:.",
+            f"--add-data", f"{(config_dir / 'config.ini')}:.",
             
             # --- Final, Complete List of Hidden Imports ---
             "--hidden-import", "apscheduler",
@@ -194,45 +230,181 @@ idle_threshold_seconds = 300
             "--hidden-import", "gi.repository.Atspi",
             
             # The entry point to your script
-            str(temp_path / "__main__.py")
+            str(daemon_src_path / "__main__.py")
         ]
         
-        subprocess.run(pyinstaller_command, check=True, cwd=temp_path, capture_output=True, text=True)
+        try:
+            subprocess.run(pyinstaller_command, check=True, cwd=work_dir, capture_output=True, text=True)
+        except subprocess.CalledProcessError as e:
+            print("PyInstaller Error:", e.stderr)
+            raise
 
-        final_executable_path = temp_path / "dist" / installer_name
+        final_executable_path = work_dir / "dist" / "tracker"
         if not final_executable_path.exists():
-            raise HTTPException(status_code=500, detail="Installer build succeeded, but output file not found.")
+            raise RuntimeError("Installer build succeeded, but output file not found.")
+
+        # Copy under a temporary name, then rename so readers never see a partial file.
+        # The gzipped copy is renamed into place first, so it exists whenever the installer does.
+        cached_installer.parent.mkdir(parents=True, exist_ok=True)
+        partial_suffix = f"{uuid.uuid4().hex}.partial"
+        gzip_path = cached_installer.with_name(f"{cached_installer.name}.gz")
+        partial_gzip_path = gzip_path.with_name(f"{gzip_path.name}.{partial_suffix}")
+        with open(final_executable_path, "rb") as src, gzip.open(partial_gzip_path, "wb", compresslevel=9) as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        os.replace(partial_gzip_path, gzip_path)
+
+        partial_path = cached_installer.with_name(f"{cached_installer.name}.{partial_suffix}")
+        shutil.copy2(final_executable_path, partial_path)
+        os.replace(partial_path, cached_installer)
+
+async def _start_installer_build(user: models.User) -> tuple[str, InstallerBuild]:
+    """
+    Returns the build job for the user's installer, starting one if it isn't cached or running.
+    The job id is the cache key, so identical requests share one build and one artifact.
+    """
+    daemon_src_path = Path(settings.DAEMON_SRC_PATH)
+    if not daemon_src_path.is_dir():
+        raise HTTPException(status_code=500, detail=f"Daemon source directory not found at: {daemon_src_path}")
 
-        # --- CHANGE: Add the cleanup task to run AFTER the response is sent ---
-        background_tasks.add_task(shutil.rmtree, temp_dir)
+    config_content = f"""
+[settings]
+employee_id = {user.employee_id}
+backend_url = {settings.DAEMON_BACKEND_URL}
+daemon_api_key = {settings.DAEMON_API_KEY}
+idle_threshold_seconds = 300
+"""
+    installer_name = f"tracker-{user.employee_id}"
+
+    src_digest = await asyncio.to_thread(_hash_directory, daemon_src_path)
+    job_id = hashlib.sha256(config_content.encode() + src_digest).hexdigest()
+
+    build = _installer_builds.get(job_id)
+    if build is None:
+        build = InstallerBuild(installer_name=installer_name, path=Path(settings.INSTALLER_CACHE_DIR) / job_id)
+        _installer_builds[job_id] = build
 
-        return FileResponse(
-            path=final_executable_path,
-            filename=installer_name,
-            media_type='application/octet-stream'
+    if not build.path.exists() and (build.task is None or build.task.done()):
+        # Runs on the dedicated build thread so the build never blocks the event loop
+        build.task = asyncio.get_running_loop().run_in_executor(
+            _build_executor, _build_installer, daemon_src_path, config_content, build.path
         )
-    except subprocess.CalledProcessError as e:
-        # If something goes wrong, still clean up the directory
-        shutil.rmtree(temp_dir)
-        print("PyInstaller Error:", e.stderr)
+    return job_id, build
+
+def _build_status(build: InstallerBuild) -> str:
+    if build.path.exists():
+        return "complete"
+    if build.task is not None and build.task.done() and build.task.exception() is not None:
+        return "failed"
+    return "pending"
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    """ True if an Accept-Encoding header allows gzip, i.e. lists gzip (or *) with a non-zero q-value. """
+    qvalues = {}
+    for entry in accept_encoding.lower().split(","):
+        coding, *params = (part.strip() for part in entry.split(";"))
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qvalues[coding] = q
+    # An explicit gzip entry wins over the * wildcard
+    return qvalues.get("gzip", qvalues.get("*", 0.0)) > 0
+
+def _installer_response(build: InstallerBuild, request: Request) -> FileResponse:
+    """ Serves the installer, pre-compressed when the client accepts gzip. """
+    if _accepts_gzip(request.headers.get("accept-encoding", "")) and build.gzip_path.exists():
+        return InstallerFileResponse(
+            path=build.gzip_path,
+            filename=build.installer_name,
+            media_type='application/octet-stream',
+            headers={"Content-Encoding": "gzip", "Vary": "Accept-Encoding"}
+        )
+    return InstallerFileResponse(
+        path=build.path,
+        filename=build.installer_name,
+        media_type='application/octet-stream',
+        headers={"Vary": "Accept-Encoding"}
+    )
+
+@router.get("/installers/{employee_id}")
+async def generate_linux_installer(
+    employee_id: str,
+    request: Request,
+    db: Session = Depends(session.get_db),
+    admin: security.CachedUser = Depends(security.get_current_admin_user)
+):
+    """
+    Generates a pre-configured, single-file Linux daemon installer for an employee.
+    Builds are cached by daemon source and config, so repeat downloads skip PyInstaller.
+    """
+    # Blocking query, so it runs in a worker thread rather than on the event loop
+    user = await asyncio.to_thread(_get_employee, db, employee_id)
+
+    job_id, build = await _start_installer_build(user)
+    if not build.path.exists():
+        try:
+            # Shielded so a client disconnect doesn't cancel a build other requests may share
+            await asyncio.shield(build.task)
+        except Exception:
+            raise HTTPException(status_code=500, detail="Failed to build the installer.")
+
+    return _installer_response(build, request)
+
+@router.post("/installers/{employee_id}", response_model=InstallerJobStatus, status_code=status.HTTP_202_ACCEPTED)
+async def enqueue_linux_installer(
+    employee_id: str,
+    db: Session = Depends(session.get_db),
+    admin: security.CachedUser = Depends(security.get_current_admin_user)
+):
+    """
+    Starts building an employee's installer in the background and returns a job id to poll.
+    """
+    # Blocking query, so it runs in a worker thread rather than on the event loop
+    user = await asyncio.to_thread(_get_employee, db, employee_id)
+
+    job_id, build = await _start_installer_build(user)
+    return InstallerJobStatus(job_id=job_id, status=_build_status(build))
+
+@router.get("/installers/status/{job_id}", response_model=InstallerJobStatus)
+async def get_installer_job(
+    job_id: str,
+    request: Request,
+    admin: security.CachedUser = Depends(security.get_current_admin_user)
+):
+    """
+    Returns the installer file once the build job is complete, or its status while it runs.
+    """
+    build = _installer_builds.get(job_id)
+    if build is None:
+        raise HTTPException(status_code=404, detail="Installer job not found")
+
+    build_status = _build_status(build)
+    if build_status == "complete":
+        return _installer_response(build, request)
+    if build_status == "failed":
         raise HTTPException(status_code=500, detail="Failed to build the installer.")
-    except Exception as e:
-        # Catch any other error and ensure cleanup
-        shutil.rmtree(temp_dir)
-        raise e
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content=InstallerJobStatus(job_id=job_id, status=build_status).model_dump()
+    )
 
 
 @router.get("/teams", response_model=List[TeamDetail])
 def get_all_teams(
     db: Session = Depends(session.get_db),
-    admin: models.User = Depends(security.get_current_admin_user)
+    admin: security.CachedUser = Depends(security.get_current_admin_user)
 ):
     """ Retrieves a list of all teams (and their managers) in the company. """
-    managers = db.query(models.User).filter(models.User.role == 'manager').options(joinedload(models.User.logs)).all()
+    # Load every manager's direct reports in one extra IN query instead of one query per manager
+    managers = db.query(models.User).filter(models.User.role == 'manager').options(selectinload(models.User.reports)).all()
     
     teams_output = []
     for manager in managers:
-        team_members = db.query(models.User).filter(models.User.manager_id == manager.id).all()
+        team_members = manager.reports
         
         team_detail = TeamDetail(
             manager_id=manager.id,
@@ -12,8 +12,18 @@ router = APIRouter()
 def login(db: Session = Depends(session.get_db), form_data: OAuth2PasswordRequestForm = Depends()):
     # Database logic is now here
     user = db.query(models.User).filter(models.User.email == form_data.username).first()
-    if not user or not security.verify_password(form_data.password, user.hashed_password):
+    if not user:
+        # Still pay for a full hash check so response time doesn't reveal which emails exist.
+        # Bypasses verify_password's cache: the dummy password is public, so a cached hit for it
+        # would make unknown emails answer faster than real ones.
+        security.pwd_context.verify(form_data.password, security.get_dummy_password_hash())
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect username or password")
+    if not security.verify_password(form_data.password, user.hashed_password):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect username or password")
+    if security.password_needs_rehash(user.hashed_password):
+        # Re-hash with the current argon2 parameters so this user's later logins verify faster
+        user.hashed_password = security.get_password_hash(form_data.password)
+        db.commit()
     
     access_token = security.create_access_token(data={"sub": user.email})
     return {"access_token": access_token, "token_type": "bearer"}
\ No newline at end of file
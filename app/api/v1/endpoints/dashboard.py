@@ -3,7 +3,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy import func
 from pydantic import BaseModel
 from typing import List
-from datetime import date, timedelta # <-- ADD timedelta HERE
+from datetime import date, datetime, time, timedelta, timezone # <-- ADD timedelta HERE
 
 from app.db import models, session
 from app.core import security
@@ -49,16 +49,19 @@ def get_employee_report_data(db: Session, user_id: int, start_date: date, end_da
     """Helper function to generate a productivity report for a single user."""
     # --- FIX: Use timedelta for correct date calculation ---
     inclusive_end_date = end_date + timedelta(days=1)
+    # UTC midnights, so the work details cover the same days as the daily_activity summary
+    range_start = datetime.combine(start_date, time.min, tzinfo=timezone.utc)
+    range_end = datetime.combine(inclusive_end_date, time.min, tzinfo=timezone.utc)
 
-    # Summary of time spent in each category
+    # Summary of time spent in each category, from the daily rollup
     summary_query = db.query(
-        models.ActivityLog.category,
-        func.sum(models.ActivityLog.duration_seconds).label("total_duration")
+        models.DailyActivity.category,
+        func.sum(models.DailyActivity.total_seconds).label("total_duration")
     ).filter(
-        models.ActivityLog.user_id == user_id,
-        models.ActivityLog.start_time >= start_date,
-        models.ActivityLog.start_time < inclusive_end_date # <-- Use corrected date
-    ).group_by(models.ActivityLog.category).all()
+        models.DailyActivity.user_id == user_id,
+        models.DailyActivity.day >= start_date,
+        models.DailyActivity.day <= end_date
+    ).group_by(models.DailyActivity.category).all()
     
     summary = CategorySummary(**{item.category: item.total_duration for item in summary_query})
 
@@ -69,8 +72,8 @@ def get_employee_report_data(db: Session, user_id: int, start_date: date, end_da
     ).filter(
         models.ActivityLog.user_id == user_id,
         models.ActivityLog.category == 'Work',
-        models.ActivityLog.start_time >= start_date,
-        models.ActivityLog.start_time < inclusive_end_date # <-- Use corrected date
+        models.ActivityLog.start_time >= range_start,
+        models.ActivityLog.start_time < range_end # <-- Use corrected date
     ).group_by(models.ActivityLog.details).order_by(func.sum(models.ActivityLog.duration_seconds).desc()).all()
 
     work_details = [WorkDetail(app=item.details or "Unknown", duration=item.total_duration) for item in work_details_query]
@@ -85,7 +88,7 @@ def read_dashboard_me(
     start_date: date,
     end_date: date,
     db: Session = Depends(session.get_db),
-    current_user: models.User = Depends(security.get_current_user)
+    current_user: security.CachedUser = Depends(security.get_current_user)
 ):
     """ Returns the productivity report for the currently logged-in user. """
     return get_employee_report_data(db=db, user_id=current_user.id, start_date=start_date, end_date=end_date)
@@ -96,31 +99,37 @@ def read_dashboard_team(
     start_date: date,
     end_date: date,
     db: Session = Depends(session.get_db),
-    manager: models.User = Depends(security.get_current_manager_user)
+    manager: security.CachedUser = Depends(security.get_current_manager_user)
 ):
     """ Returns an aggregated report for the manager's direct reports. """
-    inclusive_end_date = end_date + timedelta(days=1)
     team_members = db.query(models.User).filter(models.User.manager_id == manager.id).all()
     if not team_members:
         return TeamReport(team_summary=CategorySummary(), members=[])
 
     team_member_ids = [member.id for member in team_members]
-    
-    team_summary_query = db.query(
-        models.ActivityLog.category,
-        func.sum(models.ActivityLog.duration_seconds).label("total_duration")
-    ).filter(
-        models.ActivityLog.user_id.in_(team_member_ids),
-        models.ActivityLog.start_time >= start_date,
-        models.ActivityLog.start_time < inclusive_end_date # <-- Use corrected date
-    ).group_by(models.ActivityLog.category).all()
-
-    team_summary = CategorySummary(**{item.category: item.total_duration for item in team_summary_query})
 
-    member_summaries = []
-    for member in team_members:
-        report = get_employee_report_data(db=db, user_id=member.id, start_date=start_date, end_date=end_date)
-        member_summaries.append(TeamMemberSummary(employee_id=member.employee_id, name=member.full_name, summary=report.summary))
+    # One grouped query for the whole team instead of a report query per member
+    member_summary_query = db.query(
+        models.DailyActivity.user_id,
+        models.DailyActivity.category,
+        func.sum(models.DailyActivity.total_seconds).label("total_duration")
+    ).filter(
+        models.DailyActivity.user_id.in_(team_member_ids),
+        models.DailyActivity.day >= start_date,
+        models.DailyActivity.day <= end_date
+    ).group_by(models.DailyActivity.user_id, models.DailyActivity.category).all()
+
+    member_totals = {member_id: {} for member_id in team_member_ids}
+    team_totals = {}
+    for item in member_summary_query:
+        member_totals[item.user_id][item.category] = item.total_duration
+        team_totals[item.category] = team_totals.get(item.category, 0) + item.total_duration
+
+    team_summary = CategorySummary(**team_totals)
+    member_summaries = [
+        TeamMemberSummary(employee_id=member.employee_id, name=member.full_name, summary=CategorySummary(**member_totals[member.id]))
+        for member in team_members
+    ]
 
     return TeamReport(team_summary=team_summary, members=member_summaries)
 
@@ -130,7 +139,7 @@ def read_team_member_dashboard(
     start_date: date,
     end_date: date,
     db: Session = Depends(session.get_db),
-    manager: models.User = Depends(security.get_current_manager_user)
+    manager: security.CachedUser = Depends(security.get_current_manager_user)
 ):
     """ Drills down to the detailed report for a single employee who must be a direct report. """
     team_member = db.query(models.User).filter(models.User.employee_id == employee_id).first()
@@ -147,48 +156,38 @@ def read_dashboard_company(
     start_date: date,
     end_date: date,
     db: Session = Depends(session.get_db),
-    ceo: models.User = Depends(security.get_current_ceo_user)
+    ceo: security.CachedUser = Depends(security.get_current_ceo_user)
 ):
     """ Returns a high-level, aggregated report for the entire company. """
-    inclusive_end_date = end_date + timedelta(days=1)
-
-    # Overall company summary
-    company_summary_query = db.query(
-        models.ActivityLog.category,
-        func.sum(models.ActivityLog.duration_seconds).label("total_duration")
-    ).filter(
-        models.ActivityLog.start_time >= start_date,
-        models.ActivityLog.start_time < inclusive_end_date # <-- Use corrected date
-    ).group_by(models.ActivityLog.category).all()
-    company_summary = CategorySummary(**{item.category: item.total_duration for item in company_summary_query})
-
-    # Breakdown by department (team)
-    by_department = []
-    managers = db.query(models.User).filter(models.User.role == 'manager').all()
-
-    for manager in managers:
-        team_member_ids_query = db.query(models.User.id).filter(models.User.manager_id == manager.id)
-        team_member_ids = [id_tuple[0] for id_tuple in team_member_ids_query.all()]
-
-        if not team_member_ids:
-            continue
-
-        dept_summary_query = db.query(
-            models.ActivityLog.category,
-            func.sum(models.ActivityLog.duration_seconds).label("total_duration")
-        ).filter(
-            models.ActivityLog.user_id.in_(team_member_ids),
-            models.ActivityLog.start_time >= start_date,
-            models.ActivityLog.start_time < inclusive_end_date # <-- Use corrected date
-        ).group_by(models.ActivityLog.category).all()
-        
-        dept_summary = CategorySummary(**{item.category: item.total_duration for item in dept_summary_query})
-
-        by_department.append(DepartmentSummary(
+    # One grouped scan of the daily rollup, bucketed by each user's manager.
+    # Summing every bucket (including users without a manager) gives the company total.
+    dept_summary_query = db.query(
+        models.User.manager_id,
+        models.DailyActivity.category,
+        func.sum(models.DailyActivity.total_seconds).label("total_duration")
+    ).select_from(models.DailyActivity).join(models.User, models.DailyActivity.user_id == models.User.id).filter(
+        models.DailyActivity.day >= start_date,
+        models.DailyActivity.day <= end_date
+    ).group_by(models.User.manager_id, models.DailyActivity.category).all()
+
+    company_totals = {}
+    dept_totals = {}
+    for item in dept_summary_query:
+        company_totals[item.category] = company_totals.get(item.category, 0) + item.total_duration
+        if item.manager_id is not None:
+            dept_totals.setdefault(item.manager_id, {})[item.category] = item.total_duration
+    company_summary = CategorySummary(**company_totals)
+
+    # Breakdown by department (team), for every manager with at least one direct report
+    managers = db.query(models.User).filter(models.User.role == 'manager', models.User.reports.any()).all()
+    by_department = [
+        DepartmentSummary(
             department_manager_id=manager.id,
             department_manager_name=manager.full_name,
-            summary=dept_summary
-        ))
+            summary=CategorySummary(**dept_totals.get(manager.id, {}))
+        )
+        for manager in managers
+    ]
 
     return CompanyReport(company_summary=company_summary, by_department=by_department)
 
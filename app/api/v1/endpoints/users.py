@@ -14,7 +14,7 @@ class PasswordUpdate(BaseModel):
     new_password: str
 
 @router.get("/me", response_model=user_schema.User)
-def read_user_me(current_user: models.User = Depends(security.get_current_user)):
+def read_user_me(current_user: security.CachedUser = Depends(security.get_current_user)):
     """
     Get the details for the currently logged-in user.
     """
@@ -24,14 +24,16 @@ def read_user_me(current_user: models.User = Depends(security.get_current_user))
 def update_user_password(
     passwords: PasswordUpdate,
     db: Session = Depends(session.get_db),
-    current_user: models.User = Depends(security.get_current_user)
+    current_user: security.CachedUser = Depends(security.get_current_user)
 ):
     """
     Allows a logged-in user to change their own password.
     """
-    if not security.verify_password(passwords.current_password, current_user.hashed_password):
+    # current_user is a cached snapshot, so load the row to read and update the hash
+    db_user = db.get(models.User, current_user.id)
+    if not security.verify_password(passwords.current_password, db_user.hashed_password):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Incorrect current password")
     
-    current_user.hashed_password = security.get_password_hash(passwords.new_password)
+    db_user.hashed_password = security.get_password_hash(passwords.new_password)
     db.commit()
     return
\ No newline at end of file
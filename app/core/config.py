@@ -5,4 +5,7 @@ class Settings(BaseSettings):
     DATABASE_URL: str; DAEMON_API_KEY: str; PERPLEXITY_AI_API_KEY: str; DAEMON_BACKEND_URL: str
     JWT_SECRET_KEY: str; JWT_ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24
+    DAEMON_SRC_PATH: str = "/home/ashish-ram/Desktop/Final_Year/project/remote-work-tracker/client-daemon/src"
+    INSTALLER_CACHE_DIR: str = "/var/cache/tracker-installers"
+    PYINSTALLER_WORK_DIR: str = "/var/cache/pyinstaller-work"
 settings = Settings()
\ No newline at end of file
@@ -3,61 +3,154 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
-from jose import JWTError, jwt
+import jwt
 from passlib.context import CryptContext
-from datetime import datetime, timedelta
+from cachetools import TTLCache
+from dataclasses import dataclass
+from functools import cache
+import hashlib
+import hmac
+import os
+import threading
+import time
 
 from app.db import models, session
 from app.core.config import settings
 from app.schemas import token as token_schema
 
 # --- Password Hashing ---
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
-def verify_password(plain: str, hashed: str) -> bool: return pwd_context.verify(plain, hashed)
+# argon2id at 19 MiB, 2 passes, 1 lane (OWASP's minimum profile) instead of argon2-cffi's
+# 64 MiB / 3 pass / 4 lane default, which dominated login and user-creation latency.
+# passlib calls the time cost "rounds"; it hashes through argon2-cffi's C implementation.
+pwd_context = CryptContext(
+    schemes=["argon2"], deprecated="auto",
+    argon2__memory_cost=19456, argon2__rounds=2, argon2__parallelism=1,
+)
+@cache
+def get_dummy_password_hash() -> str:
+    """ Checked against when the user doesn't exist, so unknown emails take as long as wrong passwords. """
+    return pwd_context.hash("dummy-password")
+
+def warm_up_hasher() -> None:
+    """ Loads passlib's argon2 backend and the dummy hash at startup instead of on the first login. """
+    get_dummy_password_hash()
+
+# Recently verified (hash, HMAC(password)) pairs, so repeat logins skip the hasher.
+# Only successes are cached and the plaintext is never stored; the HMAC key is random per process,
+# so the cached digests can't be cracked offline the way a plain sha256 could.
+_PROCESS_SECRET = os.urandom(32)
+_verified_passwords = TTLCache(maxsize=1024, ttl=300)
+_verified_passwords_lock = threading.Lock()
+
+def verify_password(plain: str, hashed: str) -> bool:
+    key = (hashed, hmac.new(_PROCESS_SECRET, plain.encode(), hashlib.sha256).digest())
+    with _verified_passwords_lock:
+        if key in _verified_passwords:
+            return True
+    if not pwd_context.verify(plain, hashed):
+        return False
+    with _verified_passwords_lock:
+        _verified_passwords[key] = True
+    return True
+
 # Change this function back
 def get_password_hash(pwd: str) -> str: return pwd_context.hash(pwd)
+# True for hashes made with older/heavier parameters, which login upgrades in place
+def password_needs_rehash(hashed: str) -> bool: return pwd_context.needs_update(hashed)
 
 # --- JWT Creation ---
+_EXP_SECONDS = settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    # Epoch seconds, which is what a datetime "exp" gets encoded to anyway
+    to_encode.update({"exp": int(time.time()) + _EXP_SECONDS})
     return jwt.encode(to_encode, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
 
 # --- Role-Checking Dependencies ---
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(session.get_db)) -> models.User:
+@dataclass(frozen=True)
+class CachedUser:
+    """ Detached snapshot of the authenticated user; enough for role checks and /users/me. """
+    id: int
+    employee_id: str
+    email: str
+    full_name: str | None
+    title: str | None
+    role: str
+    manager_id: int | None
+
+# Recently verified tokens -> (user id, token expiry), so repeat requests skip the JWT decode.
+# Keyed by the token's sha256, never the raw token.
+_token_cache = TTLCache(maxsize=10_000, ttl=300)
+_token_cache_lock = threading.Lock()
+# User id -> CachedUser, so authenticated requests skip the users SELECT. Admin edits call
+# forget_user(); the short TTL bounds staleness across worker processes.
+_user_cache = TTLCache(maxsize=5000, ttl=60)
+_user_cache_lock = threading.Lock()
+
+def _cache_user(user: models.User) -> CachedUser:
+    cached_user = CachedUser(
+        id=user.id, employee_id=user.employee_id, email=user.email, full_name=user.full_name,
+        title=user.title, role=user.role, manager_id=user.manager_id,
+    )
+    with _user_cache_lock:
+        _user_cache[user.id] = cached_user
+    return cached_user
+
+def forget_user(user_id: int) -> None:
+    """ Drops a user's cached snapshot after their details change or they are deleted. """
+    with _user_cache_lock:
+        _user_cache.pop(user_id, None)
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(session.get_db)) -> CachedUser:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    token_key = hashlib.sha256(token.encode()).digest()
+    with _token_cache_lock:
+        cached = _token_cache.get(token_key)
+    if cached is not None and cached[1] > time.time():
+        with _user_cache_lock:
+            cached_user = _user_cache.get(cached[0])
+        if cached_user is not None:
+            return cached_user
+        user = db.get(models.User, cached[0])
+        if user is not None:
+            return _cache_user(user)
+
     try:
         payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
         email: str = payload.get("sub")
         if email is None:
             raise credentials_exception
         token_data = token_schema.TokenData(email=email)
-    except JWTError:
+    except jwt.PyJWTError:
         raise credentials_exception
     
     user = db.query(models.User).filter(models.User.email == token_data.email).first()
     if user is None:
         raise credentials_exception
-    return user
-
-def get_current_admin_user(current_user: models.User = Depends(get_current_user)):
-    if current_user.role not in ["hr", "ceo"]:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough permissions for this resource")
-    return current_user
-
-def get_current_manager_user(current_user: models.User = Depends(get_current_user)):
-    if current_user.role != "manager":
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Requires manager role")
-    return current_user
-
-def get_current_ceo_user(current_user: models.User = Depends(get_current_user)):
-    if current_user.role != "ceo":
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Requires CEO role")
-    return current_user
\ No newline at end of file
+
+    if "exp" in payload:
+        with _token_cache_lock:
+            _token_cache[token_key] = (user.id, payload["exp"])
+    return _cache_user(user)
+
+def require_roles(*roles: str, detail: str = "Not enough permissions for this resource"):
+    """ Builds a dependency that returns the current user if their role is one of `roles`, else 403s. """
+    allowed = frozenset(roles)
+
+    def dependency(current_user: CachedUser = Depends(get_current_user)) -> CachedUser:
+        if current_user.role not in allowed:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=detail)
+        return current_user
+
+    return dependency
+
+get_current_admin_user = require_roles("hr", "ceo")
+get_current_manager_user = require_roles("manager", detail="Requires manager role")
+get_current_ceo_user = require_roles("ceo", detail="Requires CEO role")
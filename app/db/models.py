@@ -1,30 +1,71 @@
 # backend-server/app/db/models.py
-from sqlalchemy import ( Column, Integer, String, ForeignKey, DateTime, Text, CheckConstraint )
-from sqlalchemy.orm import relationship
+from sqlalchemy import ( Column, Integer, String, ForeignKey, DateTime, Date, Text, Enum, Index, DDL, event )
+from sqlalchemy.orm import relationship, backref
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
 
+# Native Postgres enums: validated by the database and stored in 4 bytes per row
+UserRole = Enum("employee", "manager", "hr", "ceo", name="user_role")
+ActivityCategory = Enum("Work", "Private", "Idle", name="activity_category")
+
 class User(Base):
     __tablename__ = "users"
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     employee_id = Column(String(50), unique=True, nullable=False, index=True)
     full_name = Column(String(100))
     title = Column(String(100), nullable=True)
     email = Column(String(100), unique=True, nullable=False, index=True)
     hashed_password = Column(String(255), nullable=False)
-    role = Column(String(20), nullable=False)
+    role = Column(UserRole, nullable=False)
     manager_id = Column(Integer, ForeignKey("users.id"))
-    __table_args__ = ( CheckConstraint("role IN ('employee', 'manager', 'hr', 'ceo')"), )
-    logs = relationship("ActivityLog", back_populates="owner")
+    logs = relationship("ActivityLog", back_populates="owner", lazy="raise")
+    # passive_deletes="all" leaves reports untouched on delete, so the manager_id FK still blocks
+    # deleting anyone who has direct reports
+    reports = relationship("User", backref=backref("manager", remote_side=[id]), passive_deletes="all")
 
 class ActivityLog(Base):
     __tablename__ = "activity_logs"
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     start_time = Column(DateTime(timezone=True), nullable=False)
     duration_seconds = Column(Integer, nullable=False)
-    category = Column(String(20), nullable=False)
+    category = Column(ActivityCategory, nullable=False)
     details = Column(Text, nullable=True)
-    __table_args__ = ( CheckConstraint("category IN ('Work', 'Private', 'Idle')"), )
-    owner = relationship("User", back_populates="logs")
\ No newline at end of file
+    __table_args__ = (
+        # Per-user range scans for the work-details report (category totals come from daily_activity)
+        Index("ix_activity_logs_user_start_category", "user_id", "start_time", "category", postgresql_include=["duration_seconds"]),
+    )
+    owner = relationship("User", back_populates="logs")
+
+class DailyActivity(Base):
+    """ Per-user, per-day category totals, kept in sync with activity_logs by a trigger. """
+    __tablename__ = "daily_activity"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    category = Column(ActivityCategory, primary_key=True)
+    total_seconds = Column(Integer, nullable=False)
+
+# Rolls each INSERT statement on activity_logs (a whole bulk batch) into daily_activity in one
+# grouped upsert, so dashboards read a few rows per user-day instead of every 5-second log.
+# Days are UTC days whatever the session's TimeZone is; activity ingest and the reports use the same.
+event.listen(Base.metadata, "after_create", DDL("""
+CREATE OR REPLACE FUNCTION rollup_daily_activity() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO daily_activity (user_id, day, category, total_seconds)
+    SELECT user_id, (start_time AT TIME ZONE 'UTC')::date, category, SUM(duration_seconds)
+    FROM new_logs
+    GROUP BY user_id, (start_time AT TIME ZONE 'UTC')::date, category
+    ON CONFLICT (user_id, day, category)
+    DO UPDATE SET total_seconds = daily_activity.total_seconds + EXCLUDED.total_seconds;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+-- after_create fires on every create_all, so replace the trigger rather than fail on a second boot
+DROP TRIGGER IF EXISTS activity_logs_daily_rollup ON activity_logs;
+CREATE TRIGGER activity_logs_daily_rollup
+AFTER INSERT ON activity_logs
+REFERENCING NEW TABLE AS new_logs
+FOR EACH STATEMENT EXECUTE FUNCTION rollup_daily_activity();
+""").execute_if(dialect="postgresql"))
\ No newline at end of file
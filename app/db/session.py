@@ -1,9 +1,17 @@
 # backend-server/app/db/session.py
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
 
-engine = create_engine(settings.DATABASE_URL)
+# Bulk inserts already go out as multi-row INSERT ... VALUES pages (SQLAlchemy's "insertmanyvalues",
+# 1000 rows per statement by default). On psycopg2, also batch executemany() UPDATEs with
+# execute_batch(); these options only exist on that dialect, so other drivers skip them.
+_engine_options = {}
+if make_url(settings.DATABASE_URL).get_dialect().driver == "psycopg2":
+    _engine_options = {"executemany_mode": "values_plus_batch", "executemany_batch_page_size": 1000}
+
+engine = create_engine(settings.DATABASE_URL, **_engine_options)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def get_db():
@@ -11,4 +19,4 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
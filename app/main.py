@@ -1,11 +1,32 @@
 # backend-server/app/main.py
+from contextlib import asynccontextmanager
+import asyncio
+import os
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from app.api.v1.api import api_router
+from app.core import security
+from app.core.config import settings
+from app.services import categorization
 
 # Import the specific router from the auth endpoint file
 from app.api.v1.endpoints import auth
 
-app = FastAPI(title="Remote Work Tracker API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Fail fast instead of silently classifying every log as 'Private'
+    if not settings.PERPLEXITY_AI_API_KEY:
+        raise RuntimeError("PERPLEXITY_AI_API_KEY is not set")
+    # Hash once off the event loop so the first login doesn't pay for loading the argon2 backend
+    if not os.getenv("SKIP_WARMUP"):
+        await asyncio.to_thread(security.warm_up_hasher)
+    # Open the shared AI client up front and close its pooled connections on shutdown
+    categorization.get_client()
+    yield
+    await categorization.close_client()
+
+# orjson encodes the dashboard/report responses several times faster than the stdlib json module
+app = FastAPI(title="Remote Work Tracker API", default_response_class=ORJSONResponse, lifespan=lifespan)
 
 # Include the main router for all routes prefixed with /api/v1
 app.include_router(api_router, prefix="/api/v1")
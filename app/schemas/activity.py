@@ -1,9 +1,12 @@
 # backend-server/app/schemas/activity.py
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
+from pydantic.dataclasses import dataclass
 from datetime import datetime
-from typing import List
 
-class ActivityLogEntry(BaseModel):
+# Parsed once per daemon log, so a slotted dataclass keeps thousands of them free of per-instance
+# __dicts__; frozen since nothing mutates them after validation
+@dataclass(slots=True, frozen=True, config=ConfigDict(extra="ignore"))
+class ActivityLogEntry:
     timestamp: datetime
     state: str
     app: str | None = None
@@ -12,4 +15,4 @@ class ActivityLogEntry(BaseModel):
 
 class ActivityPayload(BaseModel):
     employee_id: str
-    logs: List[ActivityLogEntry]
\ No newline at end of file
+    logs: list[ActivityLogEntry]
@@ -1,5 +1,5 @@
 # backend-server/app/schemas/user.py
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, ConfigDict, EmailStr
 from typing import Optional
 from datetime import date
 
@@ -14,15 +14,12 @@ class UserCreate(UserBase):
     manager_id: Optional[int] = None
 
 class User(UserBase):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     employee_id: str
     role: str
     manager_id: Optional[int] = None
-    
-
-    class Config:
-        # This line is updated
-        from_attributes = True
 
 class HolidayBase(BaseModel):
     start_date: date
@@ -33,9 +30,7 @@ class HolidayCreate(HolidayBase):
     pass
 
 class Holiday(HolidayBase):
-    id: int
-    user_id: int
+    model_config = ConfigDict(from_attributes=True)
 
-    class Config:
-        # This line is updated
-        from_attributes = True
\ No newline at end of file
+    id: int
+    user_id: int
\ No newline at end of file
@@ -1,91 +1,295 @@
 # backend-server/app/services/categorization.py
 from app.schemas.activity import ActivityLogEntry
 from app.core.config import settings
-import httpx  
-import json
+from cachetools import TTLCache
+import asyncio
+import httpx
+import orjson
+import re
 
-async def classify_with_ai(app_name: str, window_title: str) -> str:
-    """
-    Calls the Perplexity AI API asynchronously to classify an activity.
-    """
-    api_key = settings.PERPLEXITY_AI_API_KEY
-    if not api_key:
-        print("Error: PERPLEXITY_AI_API_KEY not set.")
-        return "Private"
+# Daemons resend the same (app, title) every few seconds, so AI categories are cached process-wide.
+# Keyed by (lower-cased app, title); entries expire after a day so the AI can revise old answers.
+_category_cache: TTLCache = TTLCache(maxsize=50_000, ttl=86_400)
+# AI calls currently in flight, so concurrent lookups of the same key share one request
+_pending_categories: dict[tuple[str, str], asyncio.Future] = {}
 
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json",
-    }
+# Apps whose category doesn't depend on the window title; matched as whole words of the lower-cased
+# app name ("gnome-terminal" matches, "decoder" doesn't) before the cache or the AI is consulted
+WORK_APPS = ("code", "pycharm", "intellij", "terminal", "slack", "zoom", "excel", "outlook", "teams")
+PRIVATE_APPS = ("spotify", "netflix", "steam", "whatsapp", "telegram")
+_APP_CATEGORIES = {**{app: "Work" for app in WORK_APPS}, **{app: "Private" for app in PRIVATE_APPS}}
+# One alternation compiled once, so each lookup is a single scan regardless of how many rules there are
+_APP_RULES = re.compile(r"\b(?:" + "|".join(re.escape(app) for app in sorted(_APP_CATEGORIES, key=len, reverse=True)) + r")\b")
 
-    system_prompt = (
-        "You are an expert AI that classifies user activity based on a JSON object. "
-        "I will provide an 'app' and a 'title'. Your response must be a valid JSON object "
-        "containing a single key, 'category', with a value of either 'Work' or 'Private'. "
-        "Do not include any other text, explanations, or markdown. "
-        "Example Input: {\"app\": \"Code\", \"title\": \"main.py - MyProject\"} "
-        "Example Output: {\"category\": \"Work\"} "
-        "Example Input: {\"app\": \"spotify\", \"title\": \"Daily Mix 1\"} "
-        "Example Output: {\"category\": \"Private\"} "
-        "If the category is ambiguous, always default to 'Private'."
-    )
-    
-    user_input = {
-        "app": app_name,
-        "title": window_title
-    }
-    
+# Upper bound on (app, title) pairs sent in one batched prompt
+AI_BATCH_SIZE = 100
+
+# Sent with every AI request; PERPLEXITY_AI_API_KEY is checked once at startup (see app.main)
+_HEADERS = {
+    "Authorization": f"Bearer {settings.PERPLEXITY_AI_API_KEY}",
+    "Content-Type": "application/json",
+}
+
+_SINGLE_SYSTEM_PROMPT = (
+    "You are an expert AI that classifies user activity based on a JSON object. "
+    "I will provide an 'app' and a 'title'. Your response must be a valid JSON object "
+    "containing a single key, 'category', with a value of either 'Work' or 'Private'. "
+    "Do not include any other text, explanations, or markdown. "
+    "Example Input: {\"app\": \"Code\", \"title\": \"main.py - MyProject\"} "
+    "Example Output: {\"category\": \"Work\"} "
+    "Example Input: {\"app\": \"spotify\", \"title\": \"Daily Mix 1\"} "
+    "Example Output: {\"category\": \"Private\"} "
+    "If the category is ambiguous, always default to 'Private'."
+)
+
+_BATCH_SYSTEM_PROMPT = (
+    "You are an expert AI that classifies user activity based on a JSON array. "
+    "I will provide an array of objects, each with an index 'i', an 'app' and a 'title'. "
+    "Your response must be a valid JSON array containing one object per input object, "
+    "each with the same 'i' and a key 'category' with a value of either 'Work' or 'Private'. "
+    "Do not include any other text, explanations, or markdown. "
+    "Example Input: [{\"i\": 0, \"app\": \"Code\", \"title\": \"main.py - MyProject\"}, "
+    "{\"i\": 1, \"app\": \"spotify\", \"title\": \"Daily Mix 1\"}] "
+    "Example Output: [{\"i\": 0, \"category\": \"Work\"}, {\"i\": 1, \"category\": \"Private\"}] "
+    "If a category is ambiguous, always default to 'Private'."
+)
+
+# One pooled HTTP/2 client for every AI call, so requests reuse a warm TLS connection instead of
+# handshaking with api.perplexity.ai each time. Opened and closed by the app's lifespan.
+_client: httpx.AsyncClient | None = None
+# Caps concurrent AI requests so a burst of gathered classifications doesn't swamp the API
+_ai_semaphore = asyncio.Semaphore(16)
+
+def get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            http2=True,
+            timeout=30, # Increased timeout for AI
+            limits=httpx.Limits(max_keepalive_connections=32),
+        )
+    return _client
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+async def _ask_ai(system_prompt: str, user_content: str) -> str | None:
+    """
+    Sends one chat completion request to the Perplexity AI API.
+    Returns the reply text, or None if the API call fails.
+    """
     payload = {
         "model": "sonar-pro",
         "messages": [
             {"role": "system", "content": system_prompt},
-            {"role": "user", "content": json.dumps(user_input)},
+            {"role": "user", "content": user_content},
         ],
     }
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(
+    try:
+        async with _ai_semaphore:
+            response = await get_client().post(
                 "https://api.perplexity.ai/chat/completions",
-                headers=headers,
-                json=payload,
-                timeout=30 # Increased timeout for AI
+                headers=_HEADERS,
+                content=orjson.dumps(payload),
             )
-            response.raise_for_status()
-            
-            ai_response_text = response.json()['choices'][0]['message']['content'].strip()
-            response_data = json.loads(ai_response_text)
-            category = response_data.get("category")
-            
-            return category if category in ["Work", "Private"] else "Private"
-                
-        except httpx.HTTPStatusError as http_err:
-            print(f"❌ HTTP Error from Perplexity API: {http_err}")
-            print(f"    Response Body: {http_err.response.text}")
-            return "Private"
-        except (httpx.RequestError, json.JSONDecodeError, KeyError) as e:
-            print(f"AI API call or parsing failed: {e}")
-            return "Private"
-
-async def classify_activity(log: ActivityLogEntry) -> tuple[str, str | None]:
+        response.raise_for_status()
+
+        return orjson.loads(response.content)['choices'][0]['message']['content'].strip()
+
+    except httpx.HTTPStatusError as http_err:
+        print(f"❌ HTTP Error from Perplexity API: {http_err}")
+        print(f"    Response Body: {http_err.response.text}")
+        return None
+    except (httpx.RequestError, orjson.JSONDecodeError, KeyError) as e:
+        print(f"AI API call or parsing failed: {e}")
+        return None
+
+async def classify_with_ai(app_name: str, window_title: str) -> str | None:
+    """
+    Calls the Perplexity AI API asynchronously to classify an activity.
+    Returns None if the API call fails, so callers can tell a failure from a real answer.
+    """
+    user_input = {
+        "app": app_name,
+        "title": window_title
+    }
+
+    ai_response_text = await _ask_ai(_SINGLE_SYSTEM_PROMPT, orjson.dumps(user_input).decode())
+    if ai_response_text is None:
+        return None
+
+    try:
+        category = orjson.loads(ai_response_text).get("category")
+    except (orjson.JSONDecodeError, AttributeError) as e:
+        print(f"AI API call or parsing failed: {e}")
+        return None
+
+    return category if category in ["Work", "Private"] else "Private"
+
+async def classify_batch_with_ai(pairs: list[tuple[str, str]]) -> list[str | None] | None:
+    """
+    Classifies many (app, title) pairs with a single Perplexity AI request.
+    Returns one category per pair (None where the reply didn't cover it), or None if the API call fails.
+    """
+    user_input = [{"i": i, "app": app_name, "title": window_title} for i, (app_name, window_title) in enumerate(pairs)]
+
+    ai_response_text = await _ask_ai(_BATCH_SYSTEM_PROMPT, orjson.dumps(user_input).decode())
+    if ai_response_text is None:
+        return None
+
+    categories = [None] * len(pairs)
+    try:
+        for item in orjson.loads(ai_response_text):
+            i = item.get("i")
+            if isinstance(i, int) and 0 <= i < len(pairs):
+                category = item.get("category")
+                categories[i] = category if category in ["Work", "Private"] else "Private"
+    except (orjson.JSONDecodeError, AttributeError, TypeError) as e:
+        print(f"AI batch response parsing failed: {e}")
+        return [None] * len(pairs)
+
+    return categories
+
+def classify_by_rules(app_name: str) -> str | None:
+    """ Returns the category for a known app, or None if the AI has to decide. """
+    match = _APP_RULES.search(app_name.lower())
+    return _APP_CATEGORIES[match.group()] if match else None
+
+def _cache_key(app_name: str, window_title: str) -> tuple[str, str]:
+    """ Only the cache key is lower-cased; the AI still sees the app name as reported. """
+    return app_name.lower(), window_title
+
+def _get_cached_category(key: tuple[str, str]) -> str | None:
+    return _category_cache.get(key)
+
+def _store_category(key: tuple[str, str], category: str) -> None:
+    _category_cache[key] = category
+
+async def classify_with_cache(app_name: str, window_title: str) -> str:
+    """
+    Returns the cached category for (app, title), calling the AI at most once per key.
+    Failed AI calls fall back to 'Private' and are not cached.
+    """
+    key = _cache_key(app_name, window_title)
+    category = _get_cached_category(key)
+    if category is not None:
+        return category
+
+    task = _pending_categories.get(key)
+    if task is None:
+        task = asyncio.ensure_future(classify_with_ai(app_name, window_title))
+        _pending_categories[key] = task
+        task.add_done_callback(lambda _: _pending_categories.pop(key, None))
+
+    # Shielded so one cancelled request doesn't cancel the call for everyone waiting on it
+    category = await asyncio.shield(task)
+    if category is None:
+        return "Private"
+
+    _store_category(key, category)
+    return category
+
+def _format_details(log: ActivityLogEntry, category: str) -> str | None:
+    """ Work logs keep the app and window title as details; everything else keeps none. """
+    if category != "Work":
+        return None
+    if log.app and log.title:
+        return f"{log.app} - {log.title}"
+    return log.title or log.app
+
+def _local_category(log: ActivityLogEntry) -> str | None:
     """
-    Asynchronously classifies an activity log and correctly formats the details string.
+    Returns the category for logs that never need the cache or the AI: idle logs, known apps,
+    and logs with too little text to classify (which the AI would only call 'Private' anyway).
     """
     if log.state == "idle":
-        return "Idle", None
-
-    app = log.app or "Unknown"
-    title = log.title or "Unknown"
-    
-    # This now correctly 'awaits' the async AI call
-    category = await classify_with_ai(app, title)
-    
-    if category == "Work":
-        if log.app and log.title:
-            details = f"{log.app} - {log.title}"
+        return "Idle"
+    if log.app and (category := classify_by_rules(log.app)):
+        return category
+    if (not log.app and not log.title) or (log.title and len(log.title.strip()) < 3):
+        return "Private"
+    return None
+
+def _classification_pair(log: ActivityLogEntry) -> tuple[str, str]:
+    """ The (app, title) pair sent to the AI; logs with the same _cache_key of it share a category. """
+    return log.app or "Unknown", log.title or "Unknown"
+
+async def classify_activity_batch(logs: list[ActivityLogEntry]) -> list[tuple[str, str | None]]:
+    """
+    Classifies a batch of activity logs. Idle, known-app, near-empty and cached logs are resolved locally;
+    the remaining distinct pairs go to the AI in one request per AI_BATCH_SIZE pairs.
+    Results are returned in the same order as the input logs.
+    """
+    local = [_local_category(log) for log in logs]
+    pairs = [None if category is not None else _classification_pair(log) for log, category in zip(logs, local)]
+    keys = [None if pair is None else _cache_key(*pair) for pair in pairs]
+    # The first as-reported pair for each key, so the AI never sees the lower-cased app name
+    originals = {}
+    for key, pair in zip(keys, pairs):
+        if key is not None:
+            originals.setdefault(key, pair)
+
+    categories = {}
+    misses = []
+    in_flight = {}
+    for key in dict.fromkeys(keys):
+        if key is None:
+            continue
+        category = _get_cached_category(key)
+        if category is not None:
+            categories[key] = category
+        elif key in _pending_categories:
+            in_flight[key] = _pending_categories[key]
         else:
-            details = log.title or log.app
-    else:
-        details = None
-    
-    return category, details
\ No newline at end of file
+            misses.append(key)
+
+    unanswered = []
+    # Batches with nothing left for the AI (all idle, known or cached) never schedule anything
+    if misses:
+        # Register this batch's misses as in flight so concurrent requests wait on it instead of asking again
+        loop = asyncio.get_running_loop()
+        futures = {key: loop.create_future() for key in misses}
+        _pending_categories.update(futures)
+
+        try:
+            chunks = [misses[i:i + AI_BATCH_SIZE] for i in range(0, len(misses), AI_BATCH_SIZE)]
+            chunk_results = await asyncio.gather(*[classify_batch_with_ai([originals[key] for key in chunk]) for chunk in chunks])
+
+            for chunk, chunk_categories in zip(chunks, chunk_results):
+                if chunk_categories is None:
+                    # The API call itself failed; fall back without caching, like classify_with_cache
+                    categories.update((key, "Private") for key in chunk)
+                    continue
+                for key, category in zip(chunk, chunk_categories):
+                    if category is None:
+                        unanswered.append(key)
+                    else:
+                        categories[key] = category
+                        _store_category(key, category)
+                        futures[key].set_result(category)
+        finally:
+            for key, future in futures.items():
+                if not future.done():
+                    future.set_result(None)
+                if _pending_categories.get(key) is future:
+                    del _pending_categories[key]
+
+    # Pairs the batch reply didn't cover are retried one at a time
+    if unanswered:
+        results = await asyncio.gather(*[classify_with_cache(*originals[key]) for key in unanswered])
+        categories.update(zip(unanswered, results))
+
+    # Pairs another request was already classifying
+    if in_flight:
+        results = await asyncio.gather(*[asyncio.shield(task) for task in in_flight.values()])
+        categories.update((key, category or "Private") for key, category in zip(in_flight, results))
+
+    results = []
+    for log, category, key in zip(logs, local, keys):
+        category = category or categories[key]
+        results.append((category, _format_details(log, category)))
+    return results